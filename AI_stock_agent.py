@@ -10,17 +10,27 @@ A clean, focused agent that:
 No unnecessary complexity - just what you need.
 """
 
+from __future__ import annotations
+
 import os
-import requests
+import asyncio
+import sys
+import hashlib
+import functools
+import importlib.util
+import time
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv
-import google.generativeai as genai
-import yfinance as yf
-import warnings
-from contextlib import redirect_stderr
+import diskcache
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
+from pathlib import Path
+
+# Numba is optional and slow to import; only the large-universe kernels load it
+NUMBA_AVAILABLE = importlib.util.find_spec('numba') is not None
 
 # Load environment variables
 load_dotenv()
@@ -38,8 +48,99 @@ AI_COMPANIES = {
     "CRM": "Salesforce Inc."
 }
 
-def get_stock_data(days=30):
+# Columns of the per-ticker stock_stats table (a dict of NumPy arrays)
+STATS_COLUMNS = [
+    'ticker', 'company', 'current_price', 'daily_change', 'period_change',
+    'volatility', 'avg_daily_return', 'latest_date'
+]
+
+# Gemini models in order of preference
+GEMINI_MODELS = [
+    'gemini-2.0-flash-exp',  # Latest experimental
+    'gemini-1.5-flash',      # Fast and reliable
+    'gemini-1.5-pro',        # More capable
+]
+
+# Start the next model if the current one hasn't produced a token by then
+GEMINI_HEDGE_DELAY = 1.5  # seconds
+
+# On-disk cache for Gemini responses, keyed on the prompt
+GEMINI_CACHE_DIR = '.cache/gemini'
+GEMINI_CACHE_TTL = 6 * 3600  # seconds
+
+# Parquet cache for computed price statistics, keyed on the input data
+STATS_CACHE_DIR = '.cache'
+STATS_CACHE_TTL = 24 * 3600  # seconds
+STATS_CACHE_VERSION = 1  # bump whenever calculate_price_changes changes its output
+
+# Yahoo accepts up to 20 symbols per multi-symbol request
+YF_BATCH_SIZE = 20
+
+# Root seed for the simulated sample data
+SAMPLE_SEED = 42
+
+# Above this many (ticker, day) cells the Numba kernel beats NumPy's cumprod
+NUMBA_MIN_CELLS = 100_000
+
+# Below this many prices, thread hand-off outweighs the compiled per-ticker work
+PARALLEL_MIN_CELLS = 1_000_000
+
+@functools.lru_cache(maxsize=None)
+def make_simulate_kernel(n_tickers, n_days):
+    """Compile a random-walk kernel with the universe shape baked in as constants"""
+    from numba import njit, prange
+    
+    @njit(parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def simulate(bases, seeds, sigma, out):
+        """Fill out[i, :] with a random-walk price path per ticker"""
+        for i in prange(n_tickers):
+            np.random.seed(seeds[i])
+            price = bases[i]
+            for j in range(n_days):
+                price *= (1.0 + sigma * np.random.normal())
+                out[i, j] = price
+    
+    return simulate
+
+@functools.lru_cache(maxsize=None)
+def make_return_stats_kernel():
+    """Compile the one-pass daily return statistics kernel"""
+    from numba import njit
+    
+    @njit(cache=True, nogil=True, error_model='numpy')  # x/0 gives inf/NaN like pandas
+    def return_stats(prices):
+        """Latest, mean and sample std of daily returns in one pass (Welford)"""
+        n = len(prices) - 1
+        latest = np.nan
+        mean = 0.0
+        m2 = 0.0
+        for i in range(n):
+            latest = prices[i + 1] / prices[i] - 1.0
+            delta = latest - mean
+            mean += delta / (i + 1)
+            m2 += delta * (latest - mean)
+        
+        if n < 1:
+            return latest, np.nan, np.nan
+        if n < 2:
+            return latest, mean, np.nan
+        return latest, mean, np.sqrt(m2 / (n - 1))
+    
+    return return_stats
+
+def get_stock_data(days=30, live=False):
     """Get recent stock data for AI companies"""
+    if live:
+        print(f"📊 Fetching live market data for {len(AI_COMPANIES)} AI companies...")
+        try:
+            df = fetch_live_data(days)
+            if not df.empty:
+                return df
+            print("⚠️ No live data returned. Using sample data.")
+        except Exception as e:
+            print(f"⚠️ Live data fetch failed: {str(e)[:100]}... Using sample data.")
+        return generate_sample_data(days)
+    
     print(f"📊 Generating realistic market data for {len(AI_COMPANIES)} AI companies...")
     print("   (Using high-quality simulation for demonstration)")
     
@@ -47,14 +148,49 @@ def get_stock_data(days=30):
     # This provides a better user experience without error messages
     return generate_sample_data(days)
 
+def fetch_live_data(days=30):
+    """Fetch daily closes from Yahoo Finance in batched multi-symbol requests"""
+    import yfinance as yf
+    
+    tickers = list(AI_COMPANIES)
+    batches = [tickers[i:i + YF_BATCH_SIZE] for i in range(0, len(tickers), YF_BATCH_SIZE)]
+    
+    def download(batch):
+        frame = yf.download(
+            tickers=' '.join(batch),
+            period=f'{days}d',
+            interval='1d',
+            group_by='ticker',
+            threads=True,
+            progress=False
+        )
+        # A single-symbol download comes back with flat (field) columns
+        if frame.columns.nlevels == 1:
+            frame = pd.concat({batch[0]: frame}, axis=1)
+        return frame
+    
+    if len(batches) == 1:
+        frames = [download(batches[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            frames = list(executor.map(download, batches))
+    
+    # Wide (date x (ticker, field)) -> long (date, ticker, price)
+    closes = pd.concat([frame.xs('Close', axis=1, level=1) for frame in frames], axis=1)
+    # Missing bars (and dates absent from another batch) become NaN; drop them explicitly
+    df = closes.stack().dropna().rename('price').reset_index()
+    df.columns = ['date', 'ticker', 'price']
+    df['company'] = df['ticker'].map(AI_COMPANIES).astype('category')
+    df['ticker'] = pd.Categorical(df['ticker'], categories=tickers, ordered=True)
+    df['price'] = df['price'].astype(np.float32)
+    return df.set_index(['ticker', 'date']).sort_index()[['company', 'price']]
+
 def generate_sample_data(days=30):
     """Generate realistic sample data for demonstration"""
     print("🎭 Generating sample data for demonstration...")
     
-    all_data = []
     end_date = datetime.now().date()
-    dates = pd.date_range(end=end_date, periods=days, freq='D')
-    dates = [d for d in dates if d.weekday() < 5]  # Business days only
+    dates = pd.bdate_range(end=end_date, periods=days)  # Business days only
     
     # Base prices for AI companies
     base_prices = {
@@ -62,72 +198,157 @@ def generate_sample_data(days=30):
         'META': 320.0, 'AMD': 140.0, 'PLTR': 25.0, 'SNOW': 180.0, 'CRM': 220.0
     }
     
-    for ticker, company in AI_COMPANIES.items():
-        np.random.seed(hash(ticker) % 2**32)  # Consistent data per ticker
-        
-        prices = []
-        current_price = base_prices[ticker]
-        
-        for i in range(len(dates)):
-            # Random walk with some volatility
-            change = np.random.normal(0, 0.025)  # 2.5% daily volatility
-            current_price *= (1 + change)
-            prices.append(current_price)
-        
-        ticker_data = pd.DataFrame({
-            'date': dates[:len(prices)],
-            'ticker': ticker,
-            'company': company,
-            'price': prices
-        })
-        
-        all_data.append(ticker_data)
+    tickers = list(AI_COMPANIES)
+    bases = np.array([base_prices[t] for t in tickers])
+    n_days = len(dates)
+    
+    # Independent, reproducible PCG64 stream per ticker -> consistent data per run
+    children = np.random.SeedSequence(SAMPLE_SEED).spawn(len(tickers))
+    
+    # Random walk with 2.5% daily volatility, all price paths at once
+    if NUMBA_AVAILABLE and len(tickers) * n_days >= NUMBA_MIN_CELLS:
+        seeds = np.array([child.generate_state(1)[0] for child in children], dtype=np.uint32)
+        prices = np.empty((len(tickers), n_days))
+        make_simulate_kernel(len(tickers), n_days)(bases, seeds, 0.025, prices)
+    else:
+        rngs = [np.random.default_rng(child) for child in children]
+        returns = np.stack([rng.standard_normal(n_days) for rng in rngs]) * 0.025
+        prices = bases[:, None] * np.cumprod(1.0 + returns, axis=1)
     
-    combined_df = pd.concat(all_data, ignore_index=True)
-    return combined_df.sort_values(['ticker', 'date'])
+    # Long format indexed by (ticker, date), already in sorted order
+    codes = np.repeat(np.arange(len(tickers)), n_days)
+    df = pd.DataFrame({
+        'date': np.tile(dates, len(tickers)),
+        'ticker': pd.Categorical.from_codes(codes, categories=tickers, ordered=True),
+        'company': pd.Categorical.from_codes(codes, categories=list(AI_COMPANIES.values())),
+        'price': prices.astype(np.float32).ravel()  # Half the bytes per pass
+    })
+    return df.set_index(['ticker', 'date']).sort_index()
 
 def calculate_price_changes(df):
     """Calculate price changes and statistics"""
     print("📈 Calculating price changes and statistics...")
     
-    results = []
+    # Data arrives indexed by (ticker, date) and sorted, so group in place
+    df = df.assign(date=df.index.get_level_values('date'))
+    g = df.groupby(level='ticker', sort=False, observed=True)
+    stats = g.agg(
+        company=('company', 'last'),
+        current_price=('price', 'last'),
+        first_price=('price', 'first'),
+        latest_date=('date', 'last'),
+        count=('price', 'size')
+    )
     
-    for ticker in df['ticker'].unique():
-        ticker_data = df[df['ticker'] == ticker].sort_values('date')
+    prices = df['price'].to_numpy()
+    # The kernel only sees strictly positive prices (no NaN, no zero divisors),
+    # so both paths agree; anything else takes the NaN-aware pandas path
+    if NUMBA_AVAILABLE and len(prices) >= NUMBA_MIN_CELLS and (prices > 0).all():
+        # Large universes: one compiled Welford pass over each ticker's prices
+        return_stats = make_return_stats_kernel()
+        slices = [prices[idx] for idx in g.indices.values()]
+        workers = os.cpu_count() or 1
+        if workers > 1 and len(prices) >= PARALLEL_MIN_CELLS:
+            # The compiled kernel releases the GIL; one batch of tickers per thread
+            step = -(-len(slices) // workers)
+            batches = [slices[i:i + step] for i in range(0, len(slices), step)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = [
+                    result
+                    for batch in executor.map(lambda batch: [return_stats(p) for p in batch], batches)
+                    for result in batch
+                ]
+        else:
+            results = [return_stats(ticker_prices) for ticker_prices in slices]
         
-        if len(ticker_data) < 2:
-            continue
-        
-        # Calculate daily returns
-        ticker_data['daily_return'] = ticker_data['price'].pct_change()
-        
-        # Get latest information
-        latest = ticker_data.iloc[-1]
-        previous = ticker_data.iloc[-2]
-        first = ticker_data.iloc[0]
-        
-        # Calculate metrics
-        daily_change = (latest['price'] - previous['price']) / previous['price'] * 100
-        period_change = (latest['price'] - first['price']) / first['price'] * 100
-        
-        # Volatility (standard deviation of returns)
-        volatility = ticker_data['daily_return'].std() * np.sqrt(252) * 100  # Annualized
+        moments = pd.DataFrame(
+            results,
+            index=pd.Index(list(g.indices), name='ticker'),
+            columns=['latest_return', 'return_mean', 'return_std']
+        )
+    else:
+        # Calculate daily returns within each ticker (pandas skips NaN prices)
+        returns = g['price'].pct_change(fill_method=None)
+        moments = returns.groupby(level='ticker', sort=False, observed=True).agg(
+            latest_return='last',
+            return_mean='mean',
+            return_std='std'
+        )
+    stats = stats.join(moments)
+    stats = stats[stats['count'] >= 2].copy()
+    
+    # Calculate metrics
+    stats['daily_change'] = stats['latest_return'] * 100
+    stats['period_change'] = (stats['current_price'] - stats['first_price']) / stats['first_price'] * 100
+    
+    # Volatility (standard deviation of returns)
+    stats['volatility'] = stats['return_std'] * np.sqrt(252) * 100  # Annualized
+    
+    # Average daily return
+    stats['avg_daily_return'] = stats['return_mean'] * 100
+    
+    # Prices are float32; the small result table goes back to float64
+    metrics = ['current_price', 'daily_change', 'period_change', 'volatility', 'avg_daily_return']
+    stats[metrics] = stats[metrics].astype(np.float64)
+    
+    # Hand back a small struct-of-arrays rather than a DataFrame
+    stats = stats.reset_index()
+    return {column: stats[column].to_numpy() for column in STATS_COLUMNS}
+
+def stats_to_frame(stock_stats):
+    """View a stock_stats dict of arrays as a DataFrame"""
+    return pd.DataFrame(stock_stats, columns=STATS_COLUMNS)
+
+def get_price_changes(df):
+    """Calculate price statistics, reusing a cached result for identical data"""
+    digest = hashlib.blake2b(f"stats-v{STATS_CACHE_VERSION}".encode(), digest_size=8)
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    cache_dir = Path(STATS_CACHE_DIR)
+    path = cache_dir / f"stats-{digest.hexdigest()}.parquet"
+    cutoff = time.time() - STATS_CACHE_TTL
+    
+    # The cache is only a speed-up: any failure reading it counts as a miss
+    try:
+        if path.stat().st_mtime >= cutoff:
+            frame = pd.read_parquet(path, engine='pyarrow')
+            print("📈 Using cached price statistics...")
+            return {column: frame[column].to_numpy() for column in STATS_COLUMNS}
+    except FileNotFoundError:
+        pass
+    except stats_cache_errors() + (KeyError,) as e:
+        print(f"⚠️ Ignoring unreadable stats cache: {str(e)[:100]}")
+    
+    stats = calculate_price_changes(df)
+    
+    # Likewise, a failed write just skips caching
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
         
-        # Average daily return
-        avg_daily_return = ticker_data['daily_return'].mean() * 100
+        # Prune expired entries (and temp files left by interrupted runs)
+        for entry in cache_dir.glob('stats-*'):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    entry.unlink()
+            except FileNotFoundError:
+                pass  # Removed by a concurrent run
         
-        results.append({
-            'ticker': ticker,
-            'company': latest['company'],
-            'current_price': latest['price'],
-            'daily_change': daily_change,
-            'period_change': period_change,
-            'volatility': volatility,
-            'avg_daily_return': avg_daily_return,
-            'latest_date': latest['date']
-        })
-    
-    return pd.DataFrame(results)
+        # Write to a temp file and rename so concurrent runs never read a partial file
+        stats_to_frame(stats).to_parquet(tmp_path, engine='pyarrow', index=False)
+        os.replace(tmp_path, path)
+    except stats_cache_errors() as e:
+        print(f"⚠️ Could not cache price statistics: {str(e)[:100]}")
+        tmp_path.unlink(missing_ok=True)
+    
+    return stats
+
+def stats_cache_errors():
+    """Exception types that mean the Parquet stats cache is unusable"""
+    try:
+        from pyarrow import ArrowException
+    except ImportError:
+        return (OSError, ValueError, ImportError)
+    return (OSError, ValueError, ImportError, ArrowException)
 
 def analyze_with_llm(stock_stats):
     """Use Gemini 2.5 Flash to intelligently identify significant changes"""
@@ -145,24 +366,16 @@ def analyze_with_llm(stock_stats):
     
     print(f"✅ Found Gemini API key (length: {len(gemini_key)})")
     
-    # Configure Gemini
-    genai.configure(api_key=gemini_key)
-    
     # Prepare data for LLM
-    stock_summary = ""
-    for _, stock in stock_stats.iterrows():
-        stock_summary += f"""
-{stock['ticker']} ({stock['company']}):
-- Current Price: ${stock['current_price']:.2f}
-- Daily Change: {stock['daily_change']:+.2f}%
-- Period Change: {stock['period_change']:+.2f}%
-- Volatility: {stock['volatility']:.1f}%
-"""
+    # Compact CSV table: roughly half the tokens of a per-stock bullet layout
+    stock_summary = stats_to_frame(stock_stats)[[
+        'ticker', 'company', 'current_price', 'daily_change', 'period_change', 'volatility'
+    ]].to_csv(index=False, header=False, float_format='%.2f')
     
     # LLM prompt optimized for Gemini
     prompt = f"""You are an expert financial analyst specializing in AI companies. Analyze these stock performances and identify truly significant changes from an investment perspective.
 
-Stock Data:
+Stock Data (columns: ticker,company,current_price,daily_change%,period_change%,volatility%):
 {stock_summary}
 
 Analysis Requirements:
@@ -185,67 +398,143 @@ INVESTMENT RECOMMENDATION:
 
 Be concise but insightful. Focus on the most important findings."""
     
+    # Reuse a recent response for an identical prompt
+    cache_key = hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+    try:
+        with diskcache.Cache(GEMINI_CACHE_DIR) as cache:
+            cached = cache.get(cache_key)
+    except Exception as e:
+        print(f"  ⚠️ Gemini cache unavailable: {str(e)[:100]}")
+        cached = None
+    if cached is not None:
+        print("  ✅ Using cached Gemini analysis")
+        return cached
+    
     try:
-        # Try different Gemini models in order of preference
-        models_to_try = [
-            'gemini-2.0-flash-exp',  # Latest experimental
-            'gemini-1.5-flash',      # Fast and reliable
-            'gemini-1.5-pro',        # More capable
-        ]
+        # Configure Gemini (imported here: it is slow to load and unused on cache hits)
+        import google.generativeai as genai
+        genai.configure(api_key=gemini_key)
         
-        for model_name in models_to_try:
-            try:
-                print(f"  Trying {model_name}...")
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.3,
-                        max_output_tokens=1000,
-                    )
-                )
-                
-                print(f"  ✅ Success with {model_name}")
-                return response.text
-                
-            except Exception as model_error:
-                print(f"  ❌ {model_name} failed: {str(model_error)[:100]}...")
-                continue
+        model_name, analysis = asyncio.run(hedged_gemini_response(prompt))
         
-        # If all models failed
-        raise Exception("All Gemini models failed")
+        print(f"\n  ✅ Success with {model_name}")
         
     except Exception as e:
         print(f"❌ Gemini analysis failed: {str(e)[:100]}...")
         print("📋 Falling back to rule-based analysis...")
         return analyze_with_rules(stock_stats)
+    
+    # Caching is best-effort: never discard an analysis the user already saw
+    try:
+        with diskcache.Cache(GEMINI_CACHE_DIR) as cache:
+            cache.set(cache_key, analysis, expire=GEMINI_CACHE_TTL)
+    except Exception as e:
+        print(f"  ⚠️ Could not cache Gemini analysis: {str(e)[:100]}")
+    return analysis
+
+async def start_gemini_stream(model_name, prompt):
+    """Open a streaming Gemini request and wait for its first chunk"""
+    import google.generativeai as genai
+    from google.api_core.exceptions import ServiceUnavailable
+    
+    model = genai.GenerativeModel(model_name)
+    
+    # Retry only on 503 UNAVAILABLE, with exponential backoff
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception_type(ServiceUnavailable),
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=0.5, max=8),
+        reraise=True
+    ):
+        with attempt:
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.3,
+                    max_output_tokens=600,
+                ),
+                stream=True
+            )
+            stream = response.__aiter__()
+            try:
+                first_chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                # Would otherwise end the retry loop silently
+                raise Exception(f"{model_name} returned an empty response") from None
+    
+    return model_name, first_chunk, stream
+
+async def hedged_gemini_response(prompt):
+    """Race Gemini models, hedging to the next one whenever the first token is slow"""
+    candidates = iter(GEMINI_MODELS)
+    pending = set()
+    
+    def launch_next():
+        model_name = next(candidates, None)
+        if model_name is not None:
+            print(f"  Trying {model_name}...")
+            pending.add(asyncio.create_task(start_gemini_stream(model_name, prompt)))
+    
+    launch_next()
+    winner = None
+    try:
+        while pending and winner is None:
+            done, _ = await asyncio.wait(
+                pending, timeout=GEMINI_HEDGE_DELAY, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # Slow time-to-first-token: hedge with the next model
+                launch_next()
+                continue
+            
+            pending.difference_update(done)
+            for task in done:
+                if task.exception() is None:
+                    winner = winner or task.result()
+                else:
+                    print(f"  ❌ Request failed: {str(task.exception())[:100]}...")
+                    launch_next()
+    finally:
+        for task in pending:
+            task.cancel()
+    
+    if winner is None:
+        raise Exception("All Gemini models failed")
+    
+    # Stream the winning response to stdout as it arrives
+    model_name, first_chunk, stream = winner
+    chunks = [first_chunk.text]
+    sys.stdout.write(first_chunk.text)
+    sys.stdout.flush()
+    async for chunk in stream:
+        sys.stdout.write(chunk.text)
+        sys.stdout.flush()
+        chunks.append(chunk.text)
+    return model_name, "".join(chunks)
 
 def analyze_with_rules(stock_stats):
     """Fallback rule-based analysis if LLM unavailable"""
     print("📋 Using rule-based analysis...")
     
-    significant = []
-    
-    for _, stock in stock_stats.iterrows():
-        reasons = []
-        
-        # Check for significant daily moves
-        if abs(stock['daily_change']) > 5:
-            reasons.append(f"Large daily move: {stock['daily_change']:+.1f}%")
-        
-        # Check for significant period moves
-        if abs(stock['period_change']) > 15:
-            reasons.append(f"Large period move: {stock['period_change']:+.1f}%")
-        
-        # Check for high volatility relative to change
-        if stock['volatility'] > 40:
-            reasons.append(f"High volatility: {stock['volatility']:.1f}%")
-        
-        if reasons:
-            significant.append(f"{stock['ticker']} ({stock['company']}): {', '.join(reasons)}")
+    # Flag significant daily moves, period moves and high volatility
+    daily = stock_stats['daily_change']
+    period = stock_stats['period_change']
+    volatility = stock_stats['volatility']
+    mask_daily = np.abs(daily) > 5
+    mask_period = np.abs(period) > 15
+    mask_vol = volatility > 40
+    flagged = np.flatnonzero(mask_daily | mask_period | mask_vol)
     
-    if significant:
-        result = "SIGNIFICANT CHANGES:\n" + "\n".join(f"• {item}" for item in significant)
+    if flagged.size:
+        reasons = zip(
+            np.where(mask_daily[flagged], [f"Large daily move: {v:+.1f}%" for v in daily[flagged]], ""),
+            np.where(mask_period[flagged], [f"Large period move: {v:+.1f}%" for v in period[flagged]], ""),
+            np.where(mask_vol[flagged], [f"High volatility: {v:.1f}%" for v in volatility[flagged]], "")
+        )
+        result = "SIGNIFICANT CHANGES:\n" + "\n".join(
+            f"• {stock_stats['ticker'][i]} ({stock_stats['company'][i]}): {', '.join(r for r in row if r)}"
+            for i, row in zip(flagged, reasons)
+        )
     else:
         result = "SIGNIFICANT CHANGES:\nNo significant changes detected by rule-based analysis."
     
@@ -258,56 +547,66 @@ def create_report(stock_stats, llm_analysis):
     """Create a comprehensive report"""
     print("📝 Creating comprehensive report...")
     
-    report = []
-    report.append("🤖 AI STOCK MARKET INTELLIGENCE REPORT")
-    report.append("=" * 50)
-    report.append(f"📅 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    report.append(f"📊 Companies Analyzed: {len(stock_stats)}")
-    report.append("")
+    buf = StringIO()
+    buf.write("🤖 AI STOCK MARKET INTELLIGENCE REPORT\n")
+    buf.write("=" * 50 + "\n")
+    buf.write(f"📅 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    buf.write(f"📊 Companies Analyzed: {len(stock_stats['ticker'])}\n\n")
     
     # Market Overview
-    report.append("📈 MARKET OVERVIEW:")
-    avg_daily = stock_stats['daily_change'].mean()
-    avg_period = stock_stats['period_change'].mean()
+    buf.write("📈 MARKET OVERVIEW:\n")
+    daily = stock_stats['daily_change']
+    avg_daily = np.nanmean(daily)
+    avg_period = np.nanmean(stock_stats['period_change'])
+    
+    buf.write(f"• Average Daily Change: {avg_daily:+.2f}%\n")
+    buf.write(f"• Average Period Change: {avg_period:+.2f}%\n")
     
-    report.append(f"• Average Daily Change: {avg_daily:+.2f}%")
-    report.append(f"• Average Period Change: {avg_period:+.2f}%")
+    gainers = int((daily > 0).sum())
+    losers = int((daily < 0).sum())
+    buf.write(f"• Gainers vs Losers: {gainers} vs {losers}\n\n")
     
-    gainers = len(stock_stats[stock_stats['daily_change'] > 0])
-    losers = len(stock_stats[stock_stats['daily_change'] < 0])
-    report.append(f"• Gainers vs Losers: {gainers} vs {losers}")
-    report.append("")
+    # Rank once over stocks with a known daily change and slice both ends
+    valid = np.flatnonzero(~np.isnan(daily))
+    order = valid[np.argsort(daily[valid])]
+    tickers = stock_stats['ticker']
+    prices = stock_stats['current_price']
     
     # Top Performers
-    report.append("🏆 TOP PERFORMERS:")
-    top_performers = stock_stats.nlargest(3, 'daily_change')
-    for _, stock in top_performers.iterrows():
-        report.append(f"• {stock['ticker']}: {stock['daily_change']:+.2f}% (${stock['current_price']:.2f})")
-    report.append("")
+    buf.write("🏆 TOP PERFORMERS:\n")
+    buf.writelines(
+        f"• {tickers[i]}: {daily[i]:+.2f}% (${prices[i]:.2f})\n"
+        for i in order[-3:][::-1]
+    )
+    buf.write("\n")
     
     # Worst Performers  
-    report.append("📉 WORST PERFORMERS:")
-    worst_performers = stock_stats.nsmallest(3, 'daily_change')
-    for _, stock in worst_performers.iterrows():
-        report.append(f"• {stock['ticker']}: {stock['daily_change']:+.2f}% (${stock['current_price']:.2f})")
-    report.append("")
+    buf.write("📉 WORST PERFORMERS:\n")
+    buf.writelines(
+        f"• {tickers[i]}: {daily[i]:+.2f}% (${prices[i]:.2f})\n"
+        for i in order[:3]
+    )
+    buf.write("\n")
     
     # LLM Analysis
-    report.append("🧠 INTELLIGENT ANALYSIS:")
-    report.append(llm_analysis)
-    report.append("")
+    buf.write("🧠 INTELLIGENT ANALYSIS:\n")
+    buf.write(llm_analysis + "\n\n")
     
     # Full Stock Details
-    report.append("📊 DETAILED STOCK DATA:")
-    for _, stock in stock_stats.iterrows():
-        report.append(f"""
-{stock['ticker']} - {stock['company']}
-  Current Price: ${stock['current_price']:.2f}
-  Daily Change: {stock['daily_change']:+.2f}%
-  Period Change: {stock['period_change']:+.2f}%
-  Volatility: {stock['volatility']:.1f}%""")
+    buf.write("📊 DETAILED STOCK DATA:\n")
+    buf.write("\n".join(
+        f"\n{ticker} - {company}"
+        f"\n  Current Price: ${price:.2f}"
+        f"\n  Daily Change: {daily_change:+.2f}%"
+        f"\n  Period Change: {period_change:+.2f}%"
+        f"\n  Volatility: {volatility:.1f}%"
+        for ticker, company, price, daily_change, period_change, volatility in zip(
+            tickers, stock_stats['company'], prices, daily,
+            stock_stats['period_change'], stock_stats['volatility']
+        )
+    ))
     
-    return "\n".join(report)
+    return buf.getvalue()
 
 def main():
     """Main function to run the AI stock agent"""
@@ -316,14 +615,14 @@ def main():
     
     try:
         # Step 1: Get stock data
-        stock_data = get_stock_data(days=30)
+        stock_data = get_stock_data(days=30, live=os.getenv('USE_LIVE_DATA') == '1')
         
         if stock_data.empty:
             print("❌ No stock data available. Exiting.")
             return
         
         # Step 2: Calculate changes and statistics
-        stock_stats = calculate_price_changes(stock_data)
+        stock_stats = get_price_changes(stock_data)
         
         # Step 3: Use LLM for intelligent analysis
         llm_analysis = analyze_with_llm(stock_stats)
@@ -337,8 +636,7 @@ def main():
         print("=" * 60)
         
         # Save to file
-        with open('ai_stock_report.txt', 'w') as f:
-            f.write(report)
+        Path('ai_stock_report.txt').write_text(report)
         
         print(f"\n💾 Report saved to: ai_stock_report.txt")
         